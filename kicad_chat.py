@@ -4,19 +4,34 @@ KiCad-Chat: Minimal MVP for querying KiCad schematics with LLMs
 Single-file implementation without unnecessary complexity.
 """
 
+import re
 import sys
+import asyncio
+import mmap
 import json
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from array import array
+from bisect import bisect_right
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, NamedTuple, Optional
 from dataclasses import dataclass, field
 
-import sexpdata
-from openai import OpenAI
+from openai import AsyncOpenAI, BadRequestError
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
+from rich.spinner import Spinner
 from dotenv import load_dotenv
 import os
 
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib json module is the fallback
+    orjson = None
+
 # Load environment variables
 load_dotenv()
 
@@ -27,7 +42,7 @@ console = Console()
 # Data Models
 # ============================================================================
 
-@dataclass
+@dataclass(slots=True)
 class Component:
     """Represents a schematic component/symbol."""
     lib_id: str
@@ -40,29 +55,119 @@ class Component:
     pins: Dict[str, str] = field(default_factory=dict)  # pin_number: pin_name
 
 
-@dataclass
+class LibPin(NamedTuple):
+    """A pin of a library symbol, in library coordinates (y axis up)."""
+    unit: int  # 0 = shared by all units
+    style: int  # body style, 0 = shared by all styles
+    number: str
+    name: str
+    kind: str  # electrical type, e.g. 'passive', 'power_in'
+    hidden: bool
+    x: float
+    y: float
+
+
+@dataclass(slots=True)
+class LibSymbol:
+    """A symbol definition from the schematic's lib_symbols cache."""
+    name: str
+    power: bool  # power symbols name the net they are attached to
+    pins: List[LibPin] = field(default_factory=list)
+
+
+@dataclass(slots=True)
 class Net:
     """Represents an electrical net (connection)."""
     name: str
     nodes: List[tuple[str, str]] = field(default_factory=list)  # [(ref, pin), ...]
 
 
-@dataclass
-class Wire:
-    """Represents a wire connection."""
+class Wire(NamedTuple):
+    """Represents a wire connection (immutable geometry, stored as a tuple)."""
     start: tuple[float, float]
     end: tuple[float, float]
     uuid: str
 
 
-@dataclass
+class WireArray:
+    """Wires stored column-wise: flat x1, y1, x2, y2 doubles plus UUIDs.
+
+    Geometric queries only need the coordinates, so they live in one packed
+    array instead of a Wire tuple of tuples per segment. Indexing and
+    iteration still yield Wire objects.
+    """
+    __slots__ = ("xy", "uuids")
+
+    def __init__(self):
+        self.xy = array('d')
+        self.uuids: List[str] = []
+
+    def append(self, start: tuple[float, float], end: tuple[float, float], uuid: str) -> None:
+        self.xy.extend((start[0], start[1], end[0], end[1]))
+        self.uuids.append(uuid)
+
+    def __len__(self) -> int:
+        return len(self.uuids)
+
+    def __getitem__(self, i):
+        # Same contract as the list of Wires this replaces: a slice gives a
+        # list, and range() normalizes negative indexes and raises IndexError
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self.uuids))[i]]
+        i = range(len(self.uuids))[i]
+        x1, y1, x2, y2 = self.xy[4 * i:4 * i + 4]
+        return Wire(start=(x1, y1), end=(x2, y2), uuid=self.uuids[i])
+
+    def __iter__(self):
+        xy = self.xy
+        for i, uuid in enumerate(self.uuids):
+            j = 4 * i
+            yield Wire(start=(xy[j], xy[j + 1]), end=(xy[j + 2], xy[j + 3]), uuid=uuid)
+
+    def __eq__(self, other):
+        if not isinstance(other, WireArray):
+            return NotImplemented
+        return self.xy == other.xy and self.uuids == other.uuids
+
+
+class PointArray:
+    """Points (e.g. junctions) stored as flat x, y doubles."""
+    __slots__ = ("xy",)
+
+    def __init__(self):
+        self.xy = array('d')
+
+    def append(self, x: float, y: float) -> None:
+        self.xy.extend((x, y))
+
+    def __len__(self) -> int:
+        return len(self.xy) // 2
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self))[i]]
+        i = range(len(self))[i]
+        return (self.xy[2 * i], self.xy[2 * i + 1])
+
+    def __iter__(self):
+        xy = self.xy
+        for j in range(0, len(xy), 2):
+            yield (xy[j], xy[j + 1])
+
+    def __eq__(self, other):
+        if not isinstance(other, PointArray):
+            return NotImplemented
+        return self.xy == other.xy
+
+
+@dataclass(slots=True)
 class Schematic:
     """Parsed KiCad schematic data."""
     version: str
     components: Dict[str, Component]  # ref -> Component
     nets: Dict[str, Net]  # net_name -> Net
-    wires: List[Wire]
-    junctions: List[tuple[float, float]]
+    wires: WireArray
+    junctions: PointArray
     filepath: Path
 
 
@@ -70,26 +175,117 @@ class Schematic:
 # S-Expression Parser
 # ============================================================================
 
+# Token kinds, matching the group numbers in _TOKEN_RE
+TOK_OPEN, TOK_CLOSE, TOK_STRING, TOK_ATOM = 1, 2, 3, 4
+
+# One alternation per token kind; a quoted string's group excludes the quotes
+_TOKEN_RE = re.compile(rb'(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+)', re.DOTALL)
+_ESCAPE_RE = re.compile(r'\\(.)', re.DOTALL)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+def _unescape(text: str) -> str:
+    """Resolve backslash escapes inside a quoted S-expression string."""
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def parse_sexp(data: bytes, keep: Optional[frozenset] = None) -> List[Any]:
+    """Parse the first S-expression in data into nested lists of strings.
+
+    Unlike a general-purpose S-expression library there are no Symbol or
+    number objects: every atom and string is a plain str, and callers
+    convert the few numeric fields they need. data may be any bytes-like
+    buffer, including an mmap of the file.
+
+    If keep is given, top-level items whose head is not in it are skipped
+    as they stream past instead of being built and thrown away later.
+    """
+    stack: List[List[Any]] = []
+    current: List[Any] = []
+    skip = 0
+    # Hot loop: bind lookups once and decode each token straight from its
+    # match group
+    push = stack.append
+    pop = stack.pop
+    for match in _TOKEN_RE.finditer(data):
+        kind = match.lastindex
+        if skip:
+            if kind == TOK_OPEN:
+                skip += 1
+            elif kind == TOK_CLOSE:
+                skip -= 1
+            continue
+        if kind == TOK_OPEN:
+            node: List[Any] = []
+            current.append(node)
+            push(current)
+            current = node
+        elif kind == TOK_CLOSE:
+            if not stack:
+                raise ValueError(f"Unbalanced ')' at byte {match.start()}")
+            current = pop()
+            if not stack:
+                break
+        elif kind == TOK_STRING:
+            text = match.group(kind).decode('utf-8')
+            current.append(_unescape(text) if '\\' in text else text)
+        else:
+            atom = match.group(kind).decode('utf-8')
+            if keep is not None and not current and len(stack) == 2 \
+                    and atom not in keep:
+                # Head of an unwanted top-level item: drop the empty node
+                # and count parentheses until it closes
+                current = pop()
+                current.pop()
+                skip = 1
+                continue
+            current.append(atom)
+    if stack or not current:
+        raise ValueError("Unbalanced '(' in S-expression")
+    return current[0]
+
+
 class KiCadSchematicParser:
     """Parses .kicad_sch files (S-expression format) into Python objects."""
 
+    # Top-level items the parser uses; anything else (text, polylines,
+    # title block, sheet instances, ...) is skipped while tokenizing
+    SECTIONS = frozenset({
+        "version", "lib_symbols", "symbol", "wire", "junction",
+        "label", "global_label", "hierarchical_label",
+    })
+
     def __init__(self, filepath: Path):
         self.filepath = filepath
         self.raw_data = None
+        self._sections: Dict[str, List[Any]] = {}
+        # Placed pins in sheet coordinates: (ref, number, x, y, global_net)
+        self._pins: List[tuple[str, str, float, float, Optional[str]]] = []
 
     def parse(self) -> Schematic:
         """Main parsing entry point."""
-        content = self.filepath.read_text(encoding='utf-8')
-        self.raw_data = sexpdata.loads(content)
+        # Map the file instead of reading it: the tokenizer scans the pages
+        # in place and only the token slices it keeps are copied and decoded
+        with open(self.filepath, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.raw_data = parse_sexp(mm, self.SECTIONS)
+
+        # Group top-level items by token in one pass so each category
+        # below does not re-scan the whole file
+        self._sections = {}
+        self._pins = []
+        for item in self.raw_data:
+            if isinstance(item, list) and item:
+                self._sections.setdefault(item[0], []).append(item)
 
         # Extract version
         version = self._find_token_value("version", self.raw_data)
 
-        # Parse components (symbols)
-        components = self._parse_symbols()
+        # Parse library symbols (pin geometry for connectivity)
+        lib_symbols = self._parse_lib_symbols()
 
-        # Parse nets
-        nets = self._parse_nets()
+        # Parse components (symbols)
+        components = self._parse_symbols(lib_symbols)
 
         # Parse wires
         wires = self._parse_wires()
@@ -97,6 +293,9 @@ class KiCadSchematicParser:
         # Parse junctions
         junctions = self._parse_junctions()
 
+        # Parse nets and resolve which pins each one connects
+        nets = self._parse_nets(wires, junctions)
+
         return Schematic(
             version=version,
             components=components,
@@ -106,159 +305,477 @@ class KiCadSchematicParser:
             filepath=self.filepath
         )
 
+    # parse_sexp only builds plain lists and strs, so the helpers below can
+    # use exact type checks instead of isinstance()
+
     def _find_token_value(self, token_name: str, sexp: Any, default: Any = "") -> Any:
         """Find value of a token in S-expression."""
-        if not isinstance(sexp, list):
+        if type(sexp) is not list:
             return default
         for item in sexp:
-            if isinstance(item, list) and len(item) > 1:
-                if hasattr(item[0], 'value') and item[0].value() == token_name:
-                    return item[1] if len(item) > 1 else default
+            if type(item) is list and len(item) > 1 and item[0] == token_name:
+                return item[1]
         return default
 
     def _find_all_tokens(self, token_name: str, sexp: Any) -> List[Any]:
         """Find all tokens with given name."""
-        results = []
-        if not isinstance(sexp, list):
-            return results
-        for item in sexp:
-            if isinstance(item, list) and len(item) > 0:
-                if hasattr(item[0], 'value') and item[0].value() == token_name:
-                    results.append(item)
-        return results
-
-    def _parse_symbols(self) -> Dict[str, Component]:
+        if type(sexp) is not list:
+            return []
+        return [item for item in sexp
+                if type(item) is list and item and item[0] == token_name]
+
+    def _parse_lib_symbols(self) -> Dict[str, LibSymbol]:
+        """Parse the pin definitions of the cached library symbols."""
+        lib_symbols = {}
+        for section in self._sections.get("lib_symbols", []):
+            for sym in self._find_all_tokens("symbol", section):
+                lib = LibSymbol(name=sym[1], power=["power"] in sym)
+                # Pins live in sub-symbols named "<name>_<unit>_<style>"
+                for sub in self._find_all_tokens("symbol", sym):
+                    try:
+                        _, unit, style = sub[1].rsplit("_", 2)
+                        unit, style = int(unit), int(style)
+                    except ValueError:
+                        continue
+                    for pin in self._find_all_tokens("pin", sub):
+                        at_tokens = self._find_all_tokens("at", pin)
+                        if not at_tokens:
+                            continue
+                        at = at_tokens[0]
+                        name = self._find_token_value("name", pin)
+                        number = self._find_token_value("number", pin)
+                        hidden = "hide" in pin or ["hide", "yes"] in pin
+                        kind = pin[1] if len(pin) > 1 and isinstance(pin[1], str) else ""
+                        lib.pins.append(LibPin(unit, style, number, name, kind, hidden,
+                                               float(at[1]), float(at[2])))
+                lib_symbols[lib.name] = lib
+        return lib_symbols
+
+    def _parse_symbols(self, lib_symbols: Dict[str, LibSymbol]) -> Dict[str, Component]:
         """Parse all symbol instances in schematic."""
         components = {}
-        symbols = self._find_all_tokens("symbol", self.raw_data)
+        symbols = self._sections.get("symbol", [])
 
         for sym in symbols:
-            # Extract properties
-            lib_id = self._find_token_value("lib_id", sym)
-            uuid = self._find_token_value("uuid", sym)
-            unit = self._find_token_value("unit", sym, 1)
-
-            # Parse position
-            at_token = self._find_all_tokens("at", sym)
-            position = (0.0, 0.0)
-            if at_token:
-                coords = at_token[0][1:3]
-                position = (float(coords[0]), float(coords[1]))
-
-            # Parse properties (Reference, Value, etc.)
+            # Walk the symbol's children once, keeping the first lib_id,
+            # uuid, unit and at (as the lookups by name did) and every property
+            lib_id = uuid = unit = position = None
+            angle = 0.0
+            mirror = None
+            style = 1
             props = {}
             reference = ""
             value = ""
 
-            prop_tokens = self._find_all_tokens("property", sym)
-            for prop in prop_tokens:
-                if len(prop) >= 3:
-                    key = str(prop[1]).strip('"')
-                    val = str(prop[2]).strip('"')
-                    props[key] = val
-                    if key == "Reference":
-                        reference = val
-                    elif key == "Value":
-                        value = val
-
-            if reference and reference not in components:
+            for item in sym:
+                if not isinstance(item, list) or len(item) < 2:
+                    continue
+                head = item[0]
+                if head == "property":
+                    if len(item) >= 3:
+                        # Keys and lib_ids repeat on every symbol; interning
+                        # keeps one copy and makes key comparisons cheap
+                        key = sys.intern(item[1])
+                        val = item[2]
+                        props[key] = val
+                        if key == "Reference":
+                            reference = val
+                        elif key == "Value":
+                            value = val
+                elif head == "at":
+                    if position is None:
+                        position = (float(item[1]), float(item[2]))
+                        if len(item) > 3:
+                            angle = float(item[3])
+                elif head == "lib_id":
+                    if lib_id is None:
+                        lib_id = sys.intern(item[1])
+                elif head == "uuid":
+                    if uuid is None:
+                        uuid = item[1]
+                elif head == "unit":
+                    if unit is None:
+                        unit = int(item[1])
+                elif head == "mirror":
+                    mirror = item[1]
+                elif head == "convert" or head == "body_style":
+                    style = int(item[1])
+
+            if not reference:
+                continue
+
+            pins = {}
+            lib = lib_symbols.get(lib_id)
+            if lib is not None and position is not None:
+                unit_no = unit or 1
+                for pin in lib.pins:
+                    if pin.unit not in (0, unit_no) or pin.style not in (0, style):
+                        continue
+                    pins[pin.number] = pin.name
+                    # Power symbols (not PWR_FLAG, whose pin is power_out) name
+                    # their net; hidden power pins on ordinary parts join the
+                    # global net of the same name
+                    if lib.power and pin.kind == "power_in":
+                        global_net = value
+                    elif pin.hidden and pin.kind == "power_in" and not lib.power:
+                        global_net = pin.name
+                    else:
+                        global_net = None
+                    x, y = transform_pin(pin.x, pin.y, position, angle, mirror)
+                    self._pins.append((reference, pin.number, x, y, global_net))
+
+            if reference in components:
+                # Another unit of a multi-unit part: only add its pins
+                components[reference].pins.update(pins)
+            else:
                 components[reference] = Component(
-                    lib_id=lib_id,
+                    lib_id=lib_id or "",
                     reference=reference,
                     value=value,
-                    unit=unit,
-                    position=position,
-                    uuid=uuid,
-                    properties=props
+                    unit=unit or 1,
+                    position=position or (0.0, 0.0),
+                    uuid=uuid or "",
+                    properties=props,
+                    pins=pins
                 )
 
         return components
 
-    def _parse_nets(self) -> Dict[str, Net]:
-        """Parse net labels and connections."""
+    def _parse_nets(self, wires: WireArray, junctions: PointArray) -> Dict[str, Net]:
+        """Parse net labels and resolve the pins connected to each net."""
         nets = {}
-
-        # Find net labels
-        labels = self._find_all_tokens("label", self.raw_data)
-        for label in labels:
-            if len(label) >= 2:
-                net_name = str(label[1]).strip('"')
-                if net_name not in nets:
-                    nets[net_name] = Net(name=net_name)
-
-        # Find hierarchical labels
-        hier_labels = self._find_all_tokens("hierarchical_label", self.raw_data)
-        for label in hier_labels:
-            if len(label) >= 2:
-                net_name = str(label[1]).strip('"')
-                if net_name not in nets:
-                    nets[net_name] = Net(name=net_name)
-
-        # Parse connections (this is simplified - real implementation needs junction analysis)
-        # For MVP, we'll rely on LLM to infer connections from component positions and wires
+        labels = []
+
+        # Find net labels, then global and hierarchical labels
+        for token in ("label", "global_label", "hierarchical_label"):
+            for label in self._sections.get(token, []):
+                if len(label) >= 2:
+                    net_name = sys.intern(label[1])
+                    if net_name not in nets:
+                        nets[net_name] = Net(name=net_name)
+                    at_tokens = self._find_all_tokens("at", label)
+                    if at_tokens:
+                        at = at_tokens[0]
+                        labels.append((net_name, float(at[1]), float(at[2])))
+
+        # Group pins, wires, junctions and labels that touch into nets
+        for names, nodes in build_connectivity(self._pins, wires, junctions, labels):
+            if names:
+                primary = sys.intern(names[0])
+            elif len(nodes) >= 2:
+                ref, pin = nodes[0]
+                primary = sys.intern(f"Net-({ref}-Pad{pin})")
+            else:
+                continue  # unconnected pin
+
+            net = nets.get(primary)
+            if net is None:
+                net = nets[primary] = Net(name=primary)
+            net.nodes = nodes
+            # Every name on the net (labels, power symbols) resolves to it
+            for name in names[1:]:
+                nets[sys.intern(name)] = net
 
         return nets
 
-    def _parse_wires(self) -> List[Wire]:
+    def _parse_wires(self) -> WireArray:
         """Parse wire connections."""
-        wires = []
-        wire_tokens = self._find_all_tokens("wire", self.raw_data)
+        wires = WireArray()
+        wire_tokens = self._sections.get("wire", [])
 
         for wire in wire_tokens:
-            # Find pts token
-            pts_tokens = self._find_all_tokens("pts", wire)
-            if pts_tokens:
-                pts = pts_tokens[0]
-                # Extract xy coordinates
-                xy_tokens = [item for item in pts if isinstance(item, list) and
-                           len(item) > 0 and hasattr(item[0], 'value') and
-                           item[0].value() == "xy"]
-
-                if len(xy_tokens) >= 2:
-                    start = (float(xy_tokens[0][1]), float(xy_tokens[0][2]))
-                    end = (float(xy_tokens[1][1]), float(xy_tokens[1][2]))
-                    uuid = self._find_token_value("uuid", wire, "")
-                    wires.append(Wire(start=start, end=end, uuid=uuid))
+            # One pass over the wire for pts and uuid, one over pts for xy
+            pts = None
+            uuid = ""
+            for item in wire:
+                if isinstance(item, list) and item:
+                    if item[0] == "pts" and pts is None:
+                        pts = item
+                    elif item[0] == "uuid" and not uuid and len(item) > 1:
+                        uuid = item[1]
+            if pts is None:
+                continue
+
+            xy_tokens = [item for item in pts
+                         if isinstance(item, list) and item and item[0] == "xy"]
+            if len(xy_tokens) >= 2:
+                start = (float(xy_tokens[0][1]), float(xy_tokens[0][2]))
+                end = (float(xy_tokens[1][1]), float(xy_tokens[1][2]))
+                wires.append(start, end, uuid)
 
         return wires
 
-    def _parse_junctions(self) -> List[tuple[float, float]]:
+    def _parse_junctions(self) -> PointArray:
         """Parse junction points."""
-        junctions = []
-        junction_tokens = self._find_all_tokens("junction", self.raw_data)
+        junctions = PointArray()
+        junction_tokens = self._sections.get("junction", [])
 
         for junc in junction_tokens:
             at_tokens = self._find_all_tokens("at", junc)
             if at_tokens and len(at_tokens[0]) >= 3:
                 x = float(at_tokens[0][1])
                 y = float(at_tokens[0][2])
-                junctions.append((x, y))
+                junctions.append(x, y)
 
         return junctions
 
 
+# ============================================================================
+# Connectivity
+# ============================================================================
+
+# KiCad writes coordinates in mm with at most 4 decimals; snapping to that
+# grid as integers makes "same point" an exact dict lookup
+_GRID = 10000
+
+
+def _grid_key(x: float, y: float) -> tuple[int, int]:
+    return (round(x * _GRID), round(y * _GRID))
+
+
+def transform_pin(px: float, py: float, position: tuple[float, float],
+                  angle: float, mirror: Optional[str]) -> tuple[float, float]:
+    """Map a library pin position onto the sheet for a placed symbol."""
+    # Library y points up, sheet y points down
+    dx, dy = px, -py
+    # Symbol angles are multiples of 90 degrees, counter-clockwise on screen
+    for _ in range(int(round(angle / 90.0)) % 4):
+        dx, dy = dy, -dx
+    if mirror == "x":
+        dy = -dy
+    elif mirror == "y":
+        dx = -dx
+    return (position[0] + dx, position[1] + dy)
+
+
+def build_connectivity(pins: List[tuple[str, str, float, float, Optional[str]]],
+                       wires: WireArray, junctions: PointArray,
+                       labels: List[tuple[str, float, float]]
+                       ) -> List[tuple[List[str], List[tuple[str, str]]]]:
+    """Group connected items into nets.
+
+    Wire endpoints, pins, junctions and labels are snapped to integer grid
+    keys and merged with a union-find. Junctions and labels also attach to
+    the middle of a wire segment. Items that share a net name (labels,
+    power symbols, hidden power pins) are merged as well.
+
+    Returns one (names, nodes) pair per net, where nodes are the
+    (reference, pin) pairs of real components; power symbols and flags
+    ('#' references) only contribute their net name.
+    """
+    parent: Dict[Any, Any] = {}
+
+    def find(k):
+        parent.setdefault(k, k)
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    def union(a, b):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[rb] = ra
+
+    # Wires join their endpoints; index axis-aligned segments by row/column
+    # so points can be matched against segment interiors without a full scan
+    rows: Dict[int, List[tuple[int, int, tuple]]] = {}
+    cols: Dict[int, List[tuple[int, int, tuple]]] = {}
+    slanted: List[tuple[tuple, tuple]] = []
+    xy = wires.xy
+    for j in range(0, len(xy), 4):
+        a = _grid_key(xy[j], xy[j + 1])
+        b = _grid_key(xy[j + 2], xy[j + 3])
+        union(a, b)
+        if a[1] == b[1]:
+            rows.setdefault(a[1], []).append((min(a[0], b[0]), max(a[0], b[0]), a))
+        elif a[0] == b[0]:
+            cols.setdefault(a[0], []).append((min(a[1], b[1]), max(a[1], b[1]), a))
+        else:
+            slanted.append((a, b))
+
+    def attach(p):
+        """Connect a point to every wire segment passing through it."""
+        find(p)
+        for lo, hi, end in rows.get(p[1], ()):
+            if lo < p[0] < hi:
+                union(end, p)
+        for lo, hi, end in cols.get(p[0], ()):
+            if lo < p[1] < hi:
+                union(end, p)
+        for a, b in slanted:
+            cross = (b[0] - a[0]) * (p[1] - a[1]) - (b[1] - a[1]) * (p[0] - a[0])
+            if (cross == 0 and min(a[0], b[0]) <= p[0] <= max(a[0], b[0])
+                    and min(a[1], b[1]) <= p[1] <= max(a[1], b[1])):
+                union(a, p)
+
+    for x, y in junctions:
+        attach(_grid_key(x, y))
+
+    names_at: List[tuple[str, tuple]] = []
+    for name, x, y in labels:
+        p = _grid_key(x, y)
+        attach(p)
+        names_at.append((name, p))
+
+    pin_nodes: List[tuple[str, str, tuple]] = []
+    for ref, number, x, y, global_net in pins:
+        p = _grid_key(x, y)
+        find(p)
+        if global_net:
+            names_at.append((global_net, p))
+        if not ref.startswith("#"):
+            pin_nodes.append((ref, number, p))
+
+    # Items carrying the same name are on the same net wherever they sit
+    for name, p in names_at:
+        union(("name", name), p)
+
+    groups: Dict[Any, tuple[List[str], List[tuple[str, str]]]] = {}
+    for name, p in names_at:
+        names = groups.setdefault(find(p), ([], []))[0]
+        if name not in names:
+            names.append(name)
+    for ref, number, p in pin_nodes:
+        groups.setdefault(find(p), ([], []))[1].append((ref, number))
+
+    # Pins shared by all units of a part are placed once per unit; list them once
+    return [(names, sorted(set(nodes))) for names, nodes in groups.values()
+            if names or nodes]
+
+
+# ============================================================================
+# Parse Cache
+# ============================================================================
+
+# Bump whenever the dataclasses above or the parser's output change, so
+# pickles written by an older version are ignored instead of loaded
+PARSE_CACHE_VERSION = 1
+
+
+def _parse_cache_path(filepath: Path) -> Path:
+    """Cache file for a schematic; one per resolved path, replaced on change."""
+    cache_home = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    digest = hashlib.sha1(str(filepath.resolve()).encode()).hexdigest()
+    return Path(cache_home) / "kicad-chat" / f"{digest}.pkl"
+
+
+def _parse_cache_signature(filepath: Path) -> tuple[int, int, int]:
+    """What a cache entry must match to be reused: format, mtime and size."""
+    st = filepath.stat()
+    return (PARSE_CACHE_VERSION, st.st_mtime_ns, st.st_size)
+
+
+def load_schematic(filepath: Path, use_cache: bool = True) -> Schematic:
+    """Parse a schematic, reusing the cached result when the file is unchanged.
+
+    Each schematic has a single cache entry holding its signature and the
+    parsed result; a stale entry is overwritten by the fresh parse. The
+    cache is best-effort: an unreadable entry just means the file is parsed
+    again, and a failed write is ignored.
+    """
+    cache_path = _parse_cache_path(filepath) if use_cache else None
+    signature = _parse_cache_signature(filepath) if use_cache else None
+    if cache_path is not None and cache_path.exists():
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_signature, schematic = pickle.load(f)
+            if cached_signature == signature:
+                schematic.filepath = filepath
+                return schematic
+        except Exception:
+            pass
+
+    schematic = KiCadSchematicParser(filepath).parse()
+
+    if cache_path is not None:
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((signature, schematic), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            try:
+                tmp_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+    return schematic
+
+
 # ============================================================================
 # LLM Tool Functions
 # ============================================================================
 
+# Leading non-digit part of a reference designator: "R" for R12, "#PWR" for #PWR03
+_REF_PREFIX = re.compile(r'\D*')
+
+# Any of the power-rail keywords in a net name, in one case-insensitive scan
+_POWER_NET_RE = re.compile(r'vcc|vdd|gnd|vss|\+|-|power', re.IGNORECASE)
+
+
 class SchematicTools:
     """Tool functions for LLM to query schematic data."""
 
     def __init__(self, schematic: Schematic):
         self.schematic = schematic
 
+        # Components bucketed by reference prefix, so a type filter only
+        # visits matching buckets; values are lower-cased once for searches
+        self._order: Dict[str, int] = {}
+        self._by_prefix: Dict[str, List[Component]] = {}
+        self._value_rows: List[Dict] = []
+        # The schematic is read-only, so the result rows for each component
+        # are built once here and shared by every call (callers only
+        # serialize them, never modify them)
+        self._summaries: Dict[str, Dict] = {}
+        for i, comp in enumerate(schematic.components.values()):
+            self._order[comp.reference] = i
+            prefix = _REF_PREFIX.match(comp.reference).group()
+            self._by_prefix.setdefault(prefix, []).append(comp)
+            self._summaries[comp.reference] = {
+                "reference": comp.reference,
+                "value": comp.value,
+                "lib_id": comp.lib_id,
+                "position": comp.position
+            }
+            self._value_rows.append({
+                "reference": comp.reference,
+                "value": comp.value,
+                "lib_id": comp.lib_id
+            })
+
+        # All lower-cased values in one NUL-separated string, so a value
+        # search is a few str.find() scans instead of a Python-level loop;
+        # _value_starts holds each value's offset for mapping hits back
+        values = [comp.value.lower() for comp in schematic.components.values()]
+        self._values_blob = "\0".join(values)
+        self._value_starts: List[int] = []
+        offset = 0
+        for value in values:
+            self._value_starts.append(offset)
+            offset += len(value) + 1
+
+    def _components_with_prefix(self, component_type: str) -> List[Component]:
+        """Components whose reference starts with component_type, in schematic order."""
+        prefix = _REF_PREFIX.match(component_type).group()
+        if prefix != component_type:
+            # The filter has digits ("R1"), so only one bucket can match
+            return [c for c in self._by_prefix.get(prefix, ())
+                    if c.reference.startswith(component_type)]
+        buckets = [b for key, b in self._by_prefix.items() if key.startswith(prefix)]
+        if len(buckets) == 1:
+            return buckets[0]
+        return sorted((c for b in buckets for c in b), key=lambda c: self._order[c.reference])
+
     def list_components(self, component_type: Optional[str] = None) -> List[Dict]:
         """List all components, optionally filtered by type (e.g., 'R' for resistors)."""
-        components = []
-        for ref, comp in self.schematic.components.items():
-            if component_type is None or ref.startswith(component_type):
-                components.append({
-                    "reference": comp.reference,
-                    "value": comp.value,
-                    "lib_id": comp.lib_id,
-                    "position": comp.position
-                })
-        return components
+        if component_type is None:
+            matches = self.schematic.components.values()
+        else:
+            matches = self._components_with_prefix(component_type)
+        summaries = self._summaries
+        return [summaries[comp.reference] for comp in matches]
 
     def get_component(self, reference: str) -> Optional[Dict]:
         """Get detailed information about a specific component by reference (e.g., 'R1')."""
@@ -276,14 +793,21 @@ class SchematicTools:
 
     def find_components_by_value(self, value_pattern: str) -> List[Dict]:
         """Find components with value matching pattern (e.g., '10k', 'LM358')."""
+        pattern = value_pattern.lower()
+        if not pattern:
+            return list(self._value_rows)
+        if "\0" in pattern:
+            return []
+        blob, starts, rows = self._values_blob, self._value_starts, self._value_rows
         results = []
-        for comp in self.schematic.components.values():
-            if value_pattern.lower() in comp.value.lower():
-                results.append({
-                    "reference": comp.reference,
-                    "value": comp.value,
-                    "lib_id": comp.lib_id
-                })
+        hit = blob.find(pattern)
+        while hit != -1:
+            i = bisect_right(starts, hit) - 1
+            results.append(rows[i])
+            # Resume at the next value so each component is reported once
+            if i + 1 == len(starts):
+                break
+            hit = blob.find(pattern, starts[i + 1])
         return results
 
     def list_nets(self) -> List[str]:
@@ -302,138 +826,248 @@ class SchematicTools:
 
     def get_wire_connections(self) -> List[Dict]:
         """Get all wire connections in the schematic."""
+        # Read the packed columns directly rather than building Wire tuples
+        wires = self.schematic.wires
+        xy = wires.xy
         return [
-            {"start": w.start, "end": w.end, "uuid": w.uuid}
-            for w in self.schematic.wires
+            {"start": (xy[j], xy[j + 1]), "end": (xy[j + 2], xy[j + 3]), "uuid": uuid}
+            for j, uuid in zip(range(0, len(xy), 4), wires.uuids)
         ]
 
     def find_power_nets(self) -> List[str]:
         """Find nets that appear to be power rails (VCC, GND, etc.)."""
-        power_keywords = ['vcc', 'vdd', 'gnd', 'vss', '+', '-', 'power']
-        power_nets = []
-        for net_name in self.schematic.nets.keys():
-            if any(kw in net_name.lower() for kw in power_keywords):
-                power_nets.append(net_name)
-        return power_nets
+        search = _POWER_NET_RE.search
+        # Auto-named nets ("Net-(R1-Pad2)") come from a pin, never a rail
+        return [name for name in self.schematic.nets
+                if not name.startswith("Net-(") and search(name)]
 
 
 # ============================================================================
 # LLM Integration
 # ============================================================================
 
+def dumps_json(obj: Any, sort_keys: bool = False) -> str:
+    """Serialize obj to whitespace-free JSON, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode()
+    return json.dumps(obj, sort_keys=sort_keys, separators=(",", ":"))
+
+
+def loads_json(text: str) -> Any:
+    """Parse JSON text, using orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+# Row and column separators inside a TABLE cell, plus backslash itself so
+# the escapes stay unambiguous
+_CELL_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _table_cell(value: Any) -> str:
+    """One TABLE cell: None is empty and separators inside the value are escaped."""
+    if value is None:
+        return ""
+    return str(value).translate(_CELL_ESCAPES)
+
+
+def compact_tool_result(result: Any) -> str:
+    """Serialize a tool result for the LLM with as few tokens as possible.
+
+    Lists of records (components, wires, ...) that all share the same keys
+    become a tab-separated table with a single header line; everything
+    else, including records with differing keys, is whitespace-free JSON.
+    """
+    if isinstance(result, list) and result and all(isinstance(r, dict) for r in result):
+        keys = list(result[0].keys())
+        first = result[0].keys()
+        if all(r.keys() == first for r in result):
+            header = "<<TABLE cols=" + ",".join(keys) + ">>"
+            rows = ("\t".join(_table_cell(r[k]) for k in keys) for r in result)
+            return header + "\n" + "\n".join(rows)
+    return dumps_json(result)
+
+
+# Shared OpenAI clients keyed by (api_key, base_url) so every chatbot in the
+# process reuses the same HTTP connection pool instead of a fresh TLS session.
+_CLIENT_POOL: Dict[tuple, AsyncOpenAI] = {}
+_CLIENT_POOL_LOCK = threading.Lock()
+
+
+def get_openai_client(api_key: Optional[str] = None) -> AsyncOpenAI:
+    """Return a pooled OpenAI client for the given API key."""
+    key = (api_key, os.getenv("OPENAI_BASE_URL"))
+    with _CLIENT_POOL_LOCK:
+        client = _CLIENT_POOL.get(key)
+        if client is None:
+            client = AsyncOpenAI(api_key=api_key)
+            _CLIENT_POOL[key] = client
+        return client
+
+
+async def close_openai_clients() -> None:
+    """Close all pooled OpenAI clients (for clean shutdown)."""
+    with _CLIENT_POOL_LOCK:
+        clients = list(_CLIENT_POOL.values())
+        _CLIENT_POOL.clear()
+    for client in clients:
+        await client.close()
+
+
+# OpenAI tool schema for SchematicTools. Static, so it is built once at import
+# and shared by every chatbot instead of being rebuilt per instance.
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "list_components",
+            "description": "List all components in the schematic, optionally filtered by type prefix (e.g., 'R' for resistors, 'U' for ICs, 'C' for capacitors)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "component_type": {
+                        "type": "string",
+                        "description": "Optional prefix to filter components (e.g., 'R', 'C', 'U')"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_component",
+            "description": "Get detailed information about a specific component by its reference designator",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "reference": {
+                        "type": "string",
+                        "description": "Component reference designator (e.g., 'R1', 'U2', 'C3')"
+                    }
+                },
+                "required": ["reference"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_components_by_value",
+            "description": "Find components with a specific value or value pattern",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "value_pattern": {
+                        "type": "string",
+                        "description": "Value or pattern to search for (e.g., '10k', 'LM358')"
+                    }
+                },
+                "required": ["value_pattern"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "list_nets",
+            "description": "List all named nets in the schematic",
+            "parameters": {
+                "type": "object",
+                "properties": {}
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "trace_net",
+            "description": "Trace all connections on a specific net",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "net_name": {
+                        "type": "string",
+                        "description": "Name of the net to trace"
+                    }
+                },
+                "required": ["net_name"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_power_nets",
+            "description": "Find all power and ground nets in the schematic",
+            "parameters": {
+                "type": "object",
+                "properties": {}
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_wire_connections",
+            "description": "Get all wire connections showing start and end coordinates",
+            "parameters": {
+                "type": "object",
+                "properties": {}
+            }
+        }
+    }
+]
+
+
 class KiCadChatBot:
     """Chatbot for interacting with KiCad schematics via OpenAI."""
 
     def __init__(self, schematic: Schematic, api_key: str):
         self.schematic = schematic
         self.tools_instance = SchematicTools(schematic)
-        # OpenAI v2 automatically reads from OPENAI_API_KEY environment variable
-        self.client = OpenAI()
-        self.conversation_history = []
+        # Falls back to OPENAI_API_KEY from the environment when api_key is None
+        self.client = get_openai_client(api_key)
 
-        # Define tools for OpenAI v2
-        self.tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "list_components",
-                    "description": "List all components in the schematic, optionally filtered by type prefix (e.g., 'R' for resistors, 'U' for ICs, 'C' for capacitors)",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "component_type": {
-                                "type": "string",
-                                "description": "Optional prefix to filter components (e.g., 'R', 'C', 'U')"
-                            }
-                        }
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_component",
-                    "description": "Get detailed information about a specific component by its reference designator",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "reference": {
-                                "type": "string",
-                                "description": "Component reference designator (e.g., 'R1', 'U2', 'C3')"
-                            }
-                        },
-                        "required": ["reference"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "find_components_by_value",
-                    "description": "Find components with a specific value or value pattern",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "value_pattern": {
-                                "type": "string",
-                                "description": "Value or pattern to search for (e.g., '10k', 'LM358')"
-                            }
-                        },
-                        "required": ["value_pattern"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "list_nets",
-                    "description": "List all named nets in the schematic",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {}
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "trace_net",
-                    "description": "Trace all connections on a specific net",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "net_name": {
-                                "type": "string",
-                                "description": "Name of the net to trace"
-                            }
-                        },
-                        "required": ["net_name"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "find_power_nets",
-                    "description": "Find all power and ground nets in the schematic",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {}
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_wire_connections",
-                    "description": "Get all wire connections showing start and end coordinates",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {}
-                    }
-                }
-            }
-        ]
+        # LRU of JSON tool results keyed on (tool_name, canonical arguments).
+        # The schematic never changes during a session, so a repeated call
+        # can reuse the earlier result instead of re-running the tool.
+        self._tool_cache: OrderedDict[tuple, str] = OrderedDict()
+        self._tool_cache_max = 256
+        self._tool_cache_lock = threading.Lock()
+        self.tool_cache_stats = {"hits": 0, "misses": 0}
+
+        self.tools = TOOLS
+
+        # System prompt with schematic context; the schematic does not
+        # change during a session, so it is built once and reused each turn
+        self._system_prompt = f"""You are an expert electrical engineer analyzing a KiCad schematic.
+
+Schematic: {schematic.filepath.name}
+Version: {schematic.version}
+Components: {len(schematic.components)}
+Nets: {len(schematic.nets)}
+Wires: {len(schematic.wires)}
+
+You have access to tools to query this schematic. Use them to answer questions accurately.
+Tools that return a list of records answer with a compact table: a header line
+"<<TABLE cols=a,b,...>>" followed by one tab-separated row per record; an empty
+cell is a missing value, and tabs, newlines and backslashes inside a cell are
+written as \\t, \\n and \\\\.
+Provide clear, technical explanations suitable for electrical engineers."""
+
+        # Transcript sent to the API: the system prompt, then the history
+        self._messages: List[Dict] = [{"role": "system", "content": self._system_prompt}]
+
+        # Optional OpenAI service tier; the pinned SDK accepts "auto" (use
+        # scale tier capacity when the account has it) or "default"
+        self.service_tier = os.getenv("OPENAI_SERVICE_TIER") or None
+
+    @property
+    def conversation_history(self) -> List[Dict]:
+        """The user and assistant messages exchanged so far."""
+        return self._messages[1:]
 
     def execute_tool(self, tool_name: str, tool_input: Dict) -> Any:
         """Execute a tool function."""
@@ -442,90 +1076,156 @@ class KiCadChatBot:
             return method(**tool_input)
         return {"error": f"Tool '{tool_name}' not found"}
 
-    def chat(self, user_message: str) -> str:
-        """Send a message and get response with tool calling."""
-        # Add user message to history
-        self.conversation_history.append({
-            "role": "user",
-            "content": user_message
-        })
-
-        # System prompt with schematic context
-        system_prompt = f"""You are an expert electrical engineer analyzing a KiCad schematic.
-
-Schematic: {self.schematic.filepath.name}
-Version: {self.schematic.version}
-Components: {len(self.schematic.components)}
-Nets: {len(self.schematic.nets)}
-Wires: {len(self.schematic.wires)}
-
-You have access to tools to query this schematic. Use them to answer questions accurately.
-Provide clear, technical explanations suitable for electrical engineers."""
-
-        # Prepare messages for OpenAI
-        messages = [
-            {"role": "system", "content": system_prompt}
-        ] + self.conversation_history
-
-        # Initial API call
-        response = self.client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            tools=self.tools,
-            tool_choice="auto"
-        )
+    def cached_tool_result(self, tool_name: str, tool_input: Dict) -> str:
+        """Execute a tool and return its JSON result, reusing cached results."""
+        key = (tool_name, dumps_json(tool_input, sort_keys=True))
+        # Parallel tool calls run on worker threads, so guard the LRU
+        with self._tool_cache_lock:
+            content = self._tool_cache.get(key)
+            if content is not None:
+                self._tool_cache.move_to_end(key)
+                self.tool_cache_stats["hits"] += 1
+                return content
+            self.tool_cache_stats["misses"] += 1
+
+        content = compact_tool_result(self.execute_tool(tool_name, tool_input))
+        with self._tool_cache_lock:
+            self._tool_cache[key] = content
+            if len(self._tool_cache) > self._tool_cache_max:
+                self._tool_cache.popitem(last=False)
+        return content
+
+    async def run_tool_calls(self, tool_calls: List[Dict]) -> List[Dict]:
+        """Run all tool calls of one assistant message concurrently."""
+        contents = await asyncio.gather(*(
+            asyncio.to_thread(self.cached_tool_result, tool_call["function"]["name"],
+                              loads_json(tool_call["function"]["arguments"]))
+            for tool_call in tool_calls
+        ))
+        return [
+            {
+                "tool_call_id": tool_call["id"],
+                "role": "tool",
+                "content": content
+            } for tool_call, content in zip(tool_calls, contents)
+        ]
 
-        # Process tool calls
-        while response.choices[0].message.tool_calls:
-            # Add assistant response to history
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": response.choices[0].message.content,
-                "tool_calls": [
-                    {
-                        "id": tool_call.id,
+    async def _create_completion(self, messages: List[Dict],
+                                 on_text: Optional[Callable[[str], None]] = None
+                                 ) -> tuple[str, List[Dict]]:
+        """Stream a completion and return its text and tool calls.
+
+        Text deltas are passed to on_text as they arrive. Tool calls come in
+        pieces keyed by index and are reassembled into the plain dicts the
+        API expects back in the assistant message.
+        """
+        params = {
+            "model": "gpt-4o",
+            "messages": messages,
+            "tools": self.tools,
+            "tool_choice": "auto",
+            "stream": True
+        }
+        stream = None
+        if self.service_tier:
+            try:
+                stream = await self.client.chat.completions.create(
+                    **params, service_tier=self.service_tier
+                )
+            except BadRequestError as e:
+                # Only a rejected tier (not available for this account or
+                # model) falls back to the default; any other 400 is real
+                if e.param != "service_tier" and "service_tier" not in (e.code or ""):
+                    raise
+                self.service_tier = None
+        if stream is None:
+            stream = await self.client.chat.completions.create(**params)
+
+        text_parts: List[str] = []
+        calls: Dict[int, Dict] = {}
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                text_parts.append(delta.content)
+                if on_text is not None:
+                    on_text(delta.content)
+            for part in delta.tool_calls or ():
+                call = calls.get(part.index)
+                if call is None:
+                    call = calls[part.index] = {
+                        "id": "",
                         "type": "function",
-                        "function": {
-                            "name": tool_call.function.name,
-                            "arguments": tool_call.function.arguments
-                        }
-                    } for tool_call in response.choices[0].message.tool_calls
-                ]
-            })
-
-            # Execute tool calls
-            tool_results = []
-            for tool_call in response.choices[0].message.tool_calls:
-                tool_name = tool_call.function.name
-                tool_input = json.loads(tool_call.function.arguments)
-                tool_result = self.execute_tool(tool_name, tool_input)
-
-                tool_results.append({
-                    "tool_call_id": tool_call.id,
-                    "role": "tool",
-                    "content": json.dumps(tool_result, indent=2)
+                        "function": {"name": "", "arguments": ""}
+                    }
+                if part.id:
+                    call["id"] = part.id
+                if part.function is not None:
+                    if part.function.name:
+                        call["function"]["name"] += part.function.name
+                    if part.function.arguments:
+                        call["function"]["arguments"] += part.function.arguments
+
+        return "".join(text_parts), [calls[index] for index in sorted(calls)]
+
+    async def chat(self, user_message: str,
+                   on_text: Optional[Callable[[str], None]] = None,
+                   on_tool_calls: Optional[Callable[[List[Dict]], None]] = None) -> str:
+        """Send a message and get response with tool calling.
+
+        If on_text is given it receives the reply text as it streams in.
+        Text streamed before a round of tool calls is not part of the final
+        answer; on_tool_calls is called with the calls as each round starts,
+        so a caller rendering the stream can discard what it has so far.
+        """
+        user_entry = {
+            "role": "user",
+            "content": user_message
+        }
+
+        # One persistent transcript (system prompt, then the history) is
+        # sent on every request. This turn's messages are appended to it in
+        # place rather than copied into a new list per request, and the tool
+        # calls and their results are cut off again once the answer is in,
+        # leaving only the question and the final answer in the history.
+        messages = self._messages
+        turn_start = len(messages)
+        messages.append(user_entry)
+
+        try:
+            # Initial API call
+            content, tool_calls = await self._create_completion(messages, on_text)
+
+            # Process tool calls
+            while tool_calls:
+                if on_tool_calls is not None:
+                    on_tool_calls(tool_calls)
+
+                # The reassembled tool calls are already plain dicts, so they
+                # go back into the turn as-is
+                messages.append({
+                    "role": "assistant",
+                    "content": content or None,
+                    "tool_calls": tool_calls
                 })
 
-            # Add tool results to history
-            self.conversation_history.extend(tool_results)
+                # Execute tool calls and add their results to the turn
+                messages.extend(await self.run_tool_calls(tool_calls))
 
-            # Continue conversation
-            messages = [
-                {"role": "system", "content": system_prompt}
-            ] + self.conversation_history
-
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                tools=self.tools,
-                tool_choice="auto"
-            )
+                # Continue conversation
+                content, tool_calls = await self._create_completion(messages, on_text)
+        except BaseException:
+            # A failed turn leaves the history as it was
+            del messages[turn_start:]
+            raise
 
         # Extract final text response
-        final_response = response.choices[0].message.content
+        final_response = content
 
-        # Add to history
-        self.conversation_history.append({
+        # Keep the exchange, without the turn's tool traffic
+        del messages[turn_start + 1:]
+        messages.append({
             "role": "assistant",
             "content": final_response
         })
@@ -537,8 +1237,56 @@ Provide clear, technical explanations suitable for electrical engineers."""
 # CLI Interface
 # ============================================================================
 
-def main():
-    """Main entry point for CLI."""
+class StreamingMarkdown:
+    """Live renderable for a reply that is still streaming in.
+
+    Chunks are only collected on arrival; the Markdown is parsed when Live
+    refreshes, so a long reply is not re-parsed on every token.
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self._spinner = Spinner("dots", text="[yellow]Thinking...[/yellow]")
+
+    def __rich_console__(self, console, options):
+        if self.parts:
+            yield Markdown("".join(self.parts))
+        else:
+            yield self._spinner
+
+
+async def stream_reply(chatbot: KiCadChatBot, question: str) -> str:
+    """Ask the chatbot a question, rendering the answer as it streams."""
+    console.print(f"\n[bold green]Assistant:[/bold green]")
+    reply = StreamingMarkdown()
+    with Live(reply, console=console, refresh_per_second=8):
+        # Only the final answer stays on screen: text streamed ahead of a
+        # round of tool calls is cleared, bringing the spinner back
+        return await chatbot.chat(question, on_text=reply.parts.append,
+                                  on_tool_calls=lambda calls: reply.parts.clear())
+
+
+def run_turn(loop: asyncio.AbstractEventLoop, coro) -> Any:
+    """Run one coroutine to completion on the session's event loop.
+
+    The prompt itself stays synchronous, so Ctrl-C there is a plain
+    KeyboardInterrupt. If Ctrl-C lands while a turn is running, the turn's
+    task is cancelled and allowed to unwind before the interrupt is re-raised.
+    """
+    task = loop.create_task(coro)
+    try:
+        return loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        task.cancel()
+        try:
+            loop.run_until_complete(task)
+        except BaseException:
+            pass  # the turn is abandoned either way
+        raise
+
+
+def run_cli(loop: asyncio.AbstractEventLoop):
+    """Run the CLI session."""
     console.print("[bold cyan]KiCad-Chat MVP[/bold cyan]", style="bold")
     console.print("Query KiCad schematics with natural language\n")
 
@@ -562,8 +1310,7 @@ def main():
     # Parse schematic
     console.print(f"[green]Loading schematic: {filepath}[/green]")
     try:
-        parser = KiCadSchematicParser(filepath)
-        schematic = parser.parse()
+        schematic = load_schematic(filepath)
         console.print(f"[green]✓[/green] Parsed: {len(schematic.components)} components, "
                      f"{len(schematic.nets)} nets, {len(schematic.wires)} wires\n")
     except Exception as e:
@@ -574,18 +1321,15 @@ def main():
     chatbot = KiCadChatBot(schematic, api_key)
 
     # Check if input is piped or interactive
-    import select
-
-    if select.select([sys.stdin], [], [], 0.0)[0]:
-        # Piped input available
+    if not sys.stdin.isatty():
+        # Piped input
         question = sys.stdin.read().strip()
         if question:
             console.print(f"[bold blue]Question:[/bold blue] {question}")
             try:
-                with console.status("[yellow]Thinking...[/yellow]"):
-                    response = chatbot.chat(question)
-                console.print(f"\n[bold green]Assistant:[/bold green]")
-                console.print(Markdown(response))
+                run_turn(loop, stream_reply(chatbot, question))
+            except KeyboardInterrupt:
+                console.print("\n\n[cyan]Goodbye![/cyan]")
             except Exception as e:
                 console.print(f"\n[red]Error: {e}[/red]")
         sys.exit(0)
@@ -604,13 +1348,8 @@ def main():
                 if not question.strip():
                     continue
 
-                # Get response
-                with console.status("[yellow]Thinking...[/yellow]"):
-                    response = chatbot.chat(question)
-
-                # Display response
-                console.print(f"\n[bold green]Assistant:[/bold green]")
-                console.print(Markdown(response))
+                # Get and display the response as it streams in
+                run_turn(loop, stream_reply(chatbot, question))
                 console.print()
 
             except KeyboardInterrupt:
@@ -620,5 +1359,21 @@ def main():
                 console.print(f"\n[red]Error: {e}[/red]\n")
 
 
+def main():
+    """Main entry point for CLI."""
+    # One event loop for the whole session, so the pooled HTTP client keeps
+    # its connections between turns
+    loop = asyncio.new_event_loop()
+    try:
+        run_cli(loop)
+    finally:
+        loop.run_until_complete(close_openai_clients())
+        loop.close()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Run the importable module rather than this __main__ copy, so objects
+    # pickled into the parse cache reference kicad_chat.* classes and load
+    # the same way from the CLI and from any importer
+    from kicad_chat import main as kicad_chat_main
+    kicad_chat_main()
@@ -0,0 +1,9 @@
+"""
+Shared pytest setup for the KiCad-Chat tests
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path so test modules can import kicad_chat
+sys.path.insert(0, str(Path(__file__).parent.parent))
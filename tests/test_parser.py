@@ -1,131 +1,486 @@
 #!/usr/bin/env python3
 """
 Basic tests for KiCad-Chat MVP
+
+Run with pytest, or directly with `python tests/test_parser.py`.
 """
 
+import asyncio
+import copy
+import os
+import shutil
+import subprocess
 import sys
+import tempfile
 from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
 
-# Add parent directory to path so we can import kicad_chat
-sys.path.insert(0, str(Path(__file__).parent.parent))
+import httpx
+import pytest
+from openai import BadRequestError
 
-from kicad_chat import KiCadSchematicParser, SchematicTools
+if __name__ == "__main__" and not __package__:
+    # Run as a plain script, so conftest.py has not set up the import path
+    sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import kicad_chat
+from kicad_chat import (KiCadChatBot, KiCadSchematicParser, SchematicTools,
+                        compact_tool_result, load_schematic, parse_sexp)
 
-def test_parser():
-    """Test that the parser can load the example schematic."""
-    print("Testing parser...")
 
-    # Path to example schematic
-    example_path = Path(__file__).parent.parent / "examples" / "simple.kicad_sch"
+EXAMPLE_PATH = Path(__file__).parent.parent / "examples" / "simple.kicad_sch"
+PIC_PATH = Path(__file__).parent.parent / "pic_programmer.kicad_sch"
 
-    if not example_path.exists():
-        print(f"❌ Example schematic not found: {example_path}")
-        return False
 
-    try:
-        parser = KiCadSchematicParser(example_path)
-        schematic = parser.parse()
-
-        print("✅ Parser loaded schematic successfully")
-        print(f"   Version: {schematic.version}")
-        print(f"   Components: {len(schematic.components)}")
-        print(f"   Nets: {len(schematic.nets)}")
-        print(f"   Wires: {len(schematic.wires)}")
-        print(f"   Junctions: {len(schematic.junctions)}")
-
-        # Check that we found the expected components
-        expected_refs = ["R1", "R2", "C1"]
-        found_refs = list(schematic.components.keys())
-
-        for ref in expected_refs:
-            if ref in found_refs:
-                comp = schematic.components[ref]
-                print(f"   ✅ {ref}: {comp.value} ({comp.lib_id})")
-            else:
-                print(f"   ❌ Missing component: {ref}")
-                return False
-
-        # Check nets
-        expected_nets = ["VCC", "GND"]
-        found_nets = list(schematic.nets.keys())
-
-        for net in expected_nets:
-            if net in found_nets:
-                print(f"   ✅ Net: {net}")
-            else:
-                print(f"   ❌ Missing net: {net}")
-                return False
+def parse_example():
+    """Parse the example schematic used by the parser and tool tests."""
+    return KiCadSchematicParser(EXAMPLE_PATH).parse()
 
-        return True
 
-    except Exception as e:
-        print(f"❌ Parser failed: {e}")
-        return False
+@pytest.fixture(scope="module")
+def schematic():
+    """The example schematic, parsed once for every test in this module."""
+    return parse_example()
 
-    except Exception as e:
-        print(f"❌ Parser failed: {e}")
-        return False
 
+@pytest.fixture(scope="module")
+def pic_schematic():
+    """pic_programmer.kicad_sch, a real KiCad 9 schematic, parsed once."""
+    return KiCadSchematicParser(PIC_PATH).parse()
 
-def test_tools():
-    """Test that the tool functions work."""
-    print("\nTesting tools...")
 
-    example_path = Path(__file__).parent.parent / "examples" / "simple.kicad_sch"
+def test_parser(schematic):
+    """Test that the parser can load the example schematic."""
+    print("Testing parser...")
+
+    print("✅ Parser loaded schematic successfully")
+    print(f"   Version: {schematic.version}")
+    print(f"   Components: {len(schematic.components)}")
+    print(f"   Nets: {len(schematic.nets)}")
+    print(f"   Wires: {len(schematic.wires)}")
+    print(f"   Junctions: {len(schematic.junctions)}")
+
+    # Check that we found the expected components
+    expected_refs = ["R1", "R2", "C1"]
+    missing_refs = set(expected_refs).difference(schematic.components)
+    assert not missing_refs, f"Missing components: {', '.join(sorted(missing_refs))}"
+    for ref in expected_refs:
+        comp = schematic.components[ref]
+        print(f"   ✅ {ref}: {comp.value} ({comp.lib_id})")
+
+    # Check nets
+    expected_nets = ["VCC", "GND"]
+    missing_nets = set(expected_nets).difference(schematic.nets)
+    assert not missing_nets, f"Missing nets: {', '.join(sorted(missing_nets))}"
+    print(f"   ✅ Nets: {', '.join(expected_nets)}")
+
+
+def test_wire_array(schematic):
+    """Test that WireArray and PointArray behave like the lists they replace."""
+    print("\nTesting wire and junction arrays...")
+
+    wires = list(schematic.wires)
+    assert schematic.wires[-1] == wires[-1], "wires[-1] differs from the last wire"
+    assert schematic.wires[1:] == wires[1:], "wires[1:] differs from the list slice"
+    assert list(schematic.junctions)[:1] == schematic.junctions[:1], \
+        "junctions[:1] differs from the list slice"
+    for seq in (schematic.wires, schematic.junctions):
+        try:
+            seq[len(seq)]
+        except IndexError:
+            pass
+        else:
+            raise AssertionError(f"{type(seq).__name__}: index past the end did not raise IndexError")
+    print("✅ indexing, slicing and bounds match list behaviour")
+
+    assert schematic == parse_example(), "two parses of the same file compare unequal"
+    print("✅ identical parses compare equal")
+
+
+def test_sexp_parser():
+    """Test the S-expression tokenizer on strings, escapes and nesting."""
+    print("\nTesting S-expression parser...")
+
+    tree = parse_sexp(b'(kicad_sch (version 20230121) (property "Value" "say \\"hi\\"") (at 1.5 -2))')
+    expected = ["kicad_sch", ["version", "20230121"],
+                ["property", "Value", 'say "hi"'], ["at", "1.5", "-2"]]
+    assert tree == expected, f"parse_sexp(): unexpected tree {tree}"
+    print("✅ parse_sexp(): nested lists with unescaped strings")
+
+    tree = parse_sexp(b'(kicad_sch (version 1) (text "a (b)" (at 0 0)) (wire (pts)))',
+                      frozenset({"version", "wire"}))
+    assert tree == ["kicad_sch", ["version", "1"], ["wire", ["pts"]]], \
+        f"parse_sexp(): keep filter gave {tree}"
+    print("✅ parse_sexp(): skips top-level items not in keep")
 
     try:
-        parser = KiCadSchematicParser(example_path)
-        schematic = parser.parse()
-        tools = SchematicTools(schematic)
+        parse_sexp(b'(kicad_sch (version 1)')
+    except ValueError:
+        print("✅ parse_sexp(): rejects unbalanced input")
+    else:
+        raise AssertionError("parse_sexp(): unbalanced input was accepted")
 
-        # Test list_components
-        all_comps = tools.list_components()
-        print(f"✅ list_components(): {len(all_comps)} components")
 
-        # Test filtering
-        resistors = tools.list_components("R")
-        print(f"✅ list_components('R'): {len(resistors)} resistors")
+def test_connectivity():
+    """Test that pins are resolved onto nets through wires and power symbols."""
+    print("\nTesting connectivity...")
 
-        capacitors = tools.list_components("C")
-        print(f"✅ list_components('C'): {len(capacitors)} capacitors")
+    example_path = Path(__file__).parent.parent / "pic_programmer.kicad_sch"
+    schematic = KiCadSchematicParser(example_path).parse()
+    tools = SchematicTools(schematic)
 
-        # Test get_component
-        r1 = tools.get_component("R1")
-        if r1 and r1["value"] == "10k":
-            print("✅ get_component('R1'): correct value 10k")
-        else:
-            print("❌ get_component('R1'): wrong value")
-            return False
+    # VCC comes from power symbols; U2's hidden VCC pin joins it by name
+    vcc = tools.trace_net("VCC")
+    vcc_nodes = {(c["ref"], c["pin"]) for c in vcc.get("connections", [])}
+    assert {("U2", "14"), ("C1", "1")} <= vcc_nodes, \
+        f"trace_net('VCC'): unexpected connections {vcc}"
+    print(f"✅ trace_net('VCC'): {len(vcc_nodes)} pins including U2.14")
 
-        # Test find_components_by_value
-        ten_k_resistors = tools.find_components_by_value("10k")
-        if len(ten_k_resistors) == 1 and ten_k_resistors[0]["reference"] == "R1":
-            print("✅ find_components_by_value('10k'): found R1")
-        else:
-            print("❌ find_components_by_value('10k'): wrong results")
-            return False
+    # A labelled net reaches the pins its wires end on
+    data_out = {(c["ref"], c["pin"]) for c in tools.trace_net("PC-DATA-OUT")["connections"]}
+    assert data_out == {("J1", "4"), ("R3", "1"), ("R4", "1")}, \
+        f"trace_net('PC-DATA-OUT'): unexpected connections {data_out}"
+    print("✅ trace_net('PC-DATA-OUT'): J1.4, R3.1, R4.1")
 
-        # Test list_nets
-        nets = tools.list_nets()
-        if len(nets) >= 2 and "VCC" in nets and "GND" in nets:
-            print(f"✅ list_nets(): {len(nets)} nets including VCC and GND")
-        else:
-            print("❌ list_nets(): missing expected nets")
-            return False
+    # Unlabelled nets are named after one of their pins
+    assert "Net-(Q1-Pad2)" in schematic.nets, "missing auto-named net Net-(Q1-Pad2)"
+    assert "Net-(Q1-Pad2)" not in tools.find_power_nets(), \
+        "auto-named net Net-(Q1-Pad2) is treated as a power rail"
+    print("✅ unlabelled nets are auto-named and not treated as rails")
 
-        # Test find_power_nets
-        power_nets = tools.find_power_nets()
-        if len(power_nets) >= 2 and "VCC" in power_nets and "GND" in power_nets:
-            print(f"✅ find_power_nets(): {len(power_nets)} power nets")
-        else:
-            print("❌ find_power_nets(): missing power nets")
-            return False
 
-        return True
+def test_tools(schematic):
+    """Test that the tool functions work."""
+    print("\nTesting tools...")
 
+    tools = SchematicTools(schematic)
+
+    # Test list_components
+    all_comps = tools.list_components()
+    print(f"✅ list_components(): {len(all_comps)} components")
+
+    # Test filtering
+    resistors = tools.list_components("R")
+    assert [c["reference"] for c in resistors] == ["R1", "R2"], \
+        f"list_components('R'): unexpected {resistors}"
+    print(f"✅ list_components('R'): {len(resistors)} resistors")
+
+    capacitors = tools.list_components("C")
+    assert [c["reference"] for c in capacitors] == ["C1"], \
+        f"list_components('C'): unexpected {capacitors}"
+    print(f"✅ list_components('C'): {len(capacitors)} capacitors")
+
+    # Test get_component
+    r1 = tools.get_component("R1")
+    assert r1 and r1["value"] == "10k", f"get_component('R1'): wrong value {r1}"
+    print("✅ get_component('R1'): correct value 10k")
+
+    # Test find_components_by_value
+    ten_k_resistors = tools.find_components_by_value("10k")
+    assert [c["reference"] for c in ten_k_resistors] == ["R1"], \
+        f"find_components_by_value('10k'): wrong results {ten_k_resistors}"
+    print("✅ find_components_by_value('10k'): found R1")
+
+    # Test list_nets
+    nets = tools.list_nets()
+    assert len(nets) >= 2 and not {"VCC", "GND"}.difference(nets), \
+        f"list_nets(): missing expected nets in {nets}"
+    print(f"✅ list_nets(): {len(nets)} nets including VCC and GND")
+
+    # Test find_power_nets
+    power_nets = tools.find_power_nets()
+    assert len(power_nets) >= 2 and not {"VCC", "GND"}.difference(power_nets), \
+        f"find_power_nets(): missing power nets in {power_nets}"
+    print(f"✅ find_power_nets(): {len(power_nets)} power nets")
+
+
+def test_component_filters(pic_schematic):
+    """Test list_components filters against a plain startswith scan."""
+    print("\nTesting component filters...")
+
+    tools = SchematicTools(pic_schematic)
+    refs = list(pic_schematic.components)
+
+    # "R" spans the R and RV buckets, "J" the J and JP buckets; results must
+    # come back merged in schematic order, as a scan over all parts gives
+    for prefix in ("R", "J", "R1", "JP", "#PWR", "X"):
+        expected = [ref for ref in refs if ref.startswith(prefix)]
+        got = [c["reference"] for c in tools.list_components(prefix)]
+        assert got == expected, f"list_components({prefix!r}): {got} != {expected}"
+    resistors = [c["reference"] for c in tools.list_components("R")]
+    assert resistors.index("R18") < resistors.index("RV1") < resistors.index("R19"), \
+        f"list_components('R'): RV1 not between R18 and R19 in {resistors}"
+    assert all(ref.startswith("R1") for ref in (c["reference"] for c in tools.list_components("R1"))), \
+        "list_components('R1'): returned refs outside R1*"
+    print("✅ list_components(): merged buckets keep schematic order")
+
+
+def test_value_search(pic_schematic):
+    """Test find_components_by_value against a plain per-value scan."""
+    print("\nTesting value search...")
+
+    tools = SchematicTools(pic_schematic)
+    components = list(pic_schematic.components.values())
+    last_value = components[-1].value
+    cases = {
+        "conn_1": "several values in a row",
+        "2": "two hits inside one value (22K, 2.2K)",
+        last_value: "a match on the last value",
+        "": "every row",
+        "no-such-part": "no match",
+    }
+    for pattern, case in cases.items():
+        expected = [c.reference for c in components if pattern.lower() in c.value.lower()]
+        got = [r["reference"] for r in tools.find_components_by_value(pattern)]
+        assert got == expected, f"find_components_by_value({pattern!r}) [{case}]: {got} != {expected}"
+    assert len(tools.find_components_by_value("")) == len(components), \
+        "find_components_by_value(''): did not return every row"
+    assert components[-1].reference in \
+        [r["reference"] for r in tools.find_components_by_value(last_value)], \
+        "find_components_by_value(): missed the last value"
+    print("✅ find_components_by_value(): matches a per-value scan")
+
+
+def test_compact_tool_result():
+    """Test the TABLE encoding of record lists sent back to the LLM."""
+    print("\nTesting tool result encoding...")
+
+    table = compact_tool_result([{"ref": "R1", "note": "a\tb\nc"}, {"ref": "R2", "note": None}])
+    assert table == "<<TABLE cols=ref,note>>\nR1\ta\\tb\\nc\nR2\t", \
+        f"compact_tool_result(): unexpected table {table!r}"
+    print("✅ compact_tool_result(): escapes separators and leaves None empty")
+
+    mixed = compact_tool_result([{"ref": "R1"}, {"ref": "R2", "value": "10k"}])
+    assert mixed == '[{"ref":"R1"},{"ref":"R2","value":"10k"}]', \
+        f"compact_tool_result(): rows with differing keys gave {mixed!r}"
+    print("✅ compact_tool_result(): falls back to JSON for differing keys")
+
+
+def _text_chunk(text):
+    """A streamed chunk carrying reply text."""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text, tool_calls=None))])
+
+
+def _tool_chunk(index, call_id=None, name=None, arguments=None):
+    """A streamed chunk carrying one fragment of a tool call."""
+    part = SimpleNamespace(index=index, id=call_id,
+                           function=SimpleNamespace(name=name, arguments=arguments))
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None, tool_calls=[part]))])
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions, replaying canned streams.
+
+    Each response is a list of chunks to stream, or an exception to raise
+    (optionally only when the request carries a service_tier). Requests
+    are recorded with a snapshot of the messages they were sent with.
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def create(self, **params):
+        self.requests.append(copy.deepcopy(params))
+        response = self.responses.pop(0)
+        if isinstance(response, BaseException):
+            raise response
+
+        async def stream():
+            for chunk in response:
+                yield chunk
+        return stream()
+
+
+def make_chatbot(schematic, responses):
+    """A KiCadChatBot whose completions come from a FakeCompletions."""
+    bot = KiCadChatBot(schematic, "sk-test")
+    bot.service_tier = None
+    fake = FakeCompletions(responses)
+    bot.client = SimpleNamespace(chat=SimpleNamespace(completions=fake))
+    return bot, fake
+
+
+def test_streamed_tool_calls(schematic):
+    """Test that streamed tool-call fragments are reassembled by index."""
+    print("\nTesting streamed tool calls...")
+
+    bot, fake = make_chatbot(schematic, [
+        [
+            _text_chunk("Let me check. "),
+            # The second call starts first; its arguments arrive last
+            _tool_chunk(1, "call_b", "list_nets", ""),
+            _tool_chunk(0, "call_a", "get_component", '{"refer'),
+            SimpleNamespace(choices=[]),
+            _tool_chunk(0, arguments='ence": '),
+            _tool_chunk(0, arguments='"R1"}'),
+            _tool_chunk(1, arguments="{}"),
+        ],
+        [_text_chunk("R1 is "), _text_chunk("10k.")],
+    ])
+    events = []
+    answer = asyncio.run(bot.chat(
+        "What is R1?",
+        on_text=lambda text: events.append(("text", text)),
+        on_tool_calls=lambda calls: events.append(("tools", [c["id"] for c in calls])),
+    ))
+
+    assert answer == "R1 is 10k.", f"chat(): unexpected answer {answer!r}"
+    assert events == [("text", "Let me check. "), ("tools", ["call_a", "call_b"]),
+                      ("text", "R1 is "), ("text", "10k.")], f"chat(): unexpected callbacks {events}"
+    assert all(request["stream"] for request in fake.requests), "completions were not streamed"
+
+    sent = fake.requests[1]["messages"][-3:]
+    assert sent[0] == {
+        "role": "assistant",
+        "content": "Let me check. ",
+        "tool_calls": [
+            {"id": "call_a", "type": "function",
+             "function": {"name": "get_component", "arguments": '{"reference": "R1"}'}},
+            {"id": "call_b", "type": "function",
+             "function": {"name": "list_nets", "arguments": "{}"}},
+        ],
+    }, f"chat(): malformed assistant tool_calls {sent[0]}"
+    assert [m["tool_call_id"] for m in sent[1:]] == ["call_a", "call_b"], \
+        f"chat(): tool results out of order {sent[1:]}"
+    assert '"value":"10k"' in sent[1]["content"], f"chat(): wrong tool result {sent[1]}"
+    print("✅ chat(): fragments joined by index and returned in index order")
+
+
+def test_chat_transcript(schematic):
+    """Test that a turn leaves only its question and answer in the transcript."""
+    print("\nTesting chat transcript...")
+
+    bot, fake = make_chatbot(schematic, [
+        [_tool_chunk(0, "call_a", "list_nets", "{}")],
+        [_text_chunk("Two nets.")],
+        # Second turn: a tool round, then the follow-up request fails
+        [_tool_chunk(0, "call_b", "list_nets", "{}")],
+        RuntimeError("connection reset"),
+    ])
+    asyncio.run(bot.chat("Which nets?"))
+    history = [{"role": "user", "content": "Which nets?"},
+               {"role": "assistant", "content": "Two nets."}]
+    assert bot.conversation_history == history, \
+        f"chat(): tool traffic left in history {bot.conversation_history}"
+    assert [m["role"] for m in fake.requests[1]["messages"]] == ["system", "user", "assistant", "tool"], \
+        "chat(): tool round was not sent with the follow-up request"
+    print("✅ a finished turn keeps only [user, assistant]")
+
+    before = len(bot._messages)
+    try:
+        asyncio.run(bot.chat("And the wires?"))
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("chat(): mid-turn failure was swallowed")
+    assert len(bot._messages) == before and bot.conversation_history == history, \
+        f"chat(): failed turn left messages behind {bot._messages[before:]}"
+    print("✅ a failed turn leaves the transcript as it was")
+
+
+def _bad_request(param, code):
+    """A 400 from the chat completions endpoint naming the offending param."""
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return BadRequestError(f"Invalid value for {param}", body={"param": param, "code": code},
+                           response=httpx.Response(400, request=request))
+
+
+def test_service_tier_fallback(schematic):
+    """Test that only a rejected service tier falls back to the default tier."""
+    print("\nTesting service tier fallback...")
+
+    bot, fake = make_chatbot(schematic, [_bad_request("service_tier", "invalid_value"),
+                                         [_text_chunk("Hello.")]])
+    bot.service_tier = "auto"
+    answer = asyncio.run(bot.chat("Hi"))
+    assert answer == "Hello.", f"chat(): unexpected answer {answer!r}"
+    assert [r.get("service_tier") for r in fake.requests] == ["auto", None], \
+        f"chat(): expected one retry without the tier, got {fake.requests}"
+    assert bot.service_tier is None, "chat(): rejected tier was kept"
+    print("✅ a rejected service_tier retries once without it")
+
+    bot, fake = make_chatbot(schematic, [_bad_request("messages", "context_length_exceeded")])
+    bot.service_tier = "auto"
+    try:
+        asyncio.run(bot.chat("Hi"))
+    except BadRequestError as e:
+        assert e.code == "context_length_exceeded", f"chat(): raised the wrong error {e}"
+    else:
+        raise AssertionError("chat(): context-length error was swallowed")
+    assert len(fake.requests) == 1, "chat(): retried an unrelated 400"
+    assert bot.service_tier == "auto", "chat(): an unrelated 400 cleared the tier"
+    print("✅ other 400s propagate and keep the tier")
+
+
+def test_parse_cache():
+    """Test that a cached parse round-trips and is reused for an unchanged file."""
+    print("\nTesting parse cache...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = Path(tmp, "cache", "kicad-chat")
+        sch_path = Path(tmp, "simple.kicad_sch")
+        shutil.copyfile(EXAMPLE_PATH, sch_path)
+
+        # patch.dict restores the environment on exit, even on failure
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": str(Path(tmp, "cache"))}):
+            parsed = load_schematic(sch_path)
+            assert len(list(cache_dir.glob("*.pkl"))) == 1, "load_schematic(): no cache file was written"
+            cached = load_schematic(sch_path)
+            assert cached is not parsed and cached == parsed, \
+                "load_schematic(): cached schematic differs from the parse"
+            print("✅ load_schematic(): reuses the cached parse")
+
+            # An edited file replaces its entry instead of adding another
+            st = sch_path.stat()
+            os.utime(sch_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+            reparsed = load_schematic(sch_path)
+            entries = list(cache_dir.iterdir())
+            assert len(entries) == 1, f"load_schematic(): stale entries left behind: {entries}"
+            assert reparsed == parsed, "load_schematic(): reparse after an edit differs"
+            print("✅ load_schematic(): an edited file replaces its cache entry")
+
+
+def test_parse_cache_from_cli():
+    """Test that a cache entry written by the CLI loads when kicad_chat is imported."""
+    print("\nTesting parse cache shared with the CLI...")
+
+    script = Path(kicad_chat.__file__)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_home = Path(tmp, "cache")
+        sch_path = Path(tmp, "simple.kicad_sch")
+        shutil.copyfile(EXAMPLE_PATH, sch_path)
+
+        # Empty piped stdin: the CLI parses, writes the cache and exits
+        env = dict(os.environ, OPENAI_API_KEY="sk-test", XDG_CACHE_HOME=str(cache_home))
+        cli = subprocess.run([sys.executable, str(script), str(sch_path)], cwd=tmp, env=env,
+                             stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=60)
+        assert cli.returncode == 0, f"CLI run failed: {cli.stdout}{cli.stderr}"
+
+        entries = list(Path(cache_home, "kicad-chat").glob("*.pkl"))
+        assert len(entries) == 1, f"CLI run wrote {len(entries)} cache entries"
+        written = entries[0].read_bytes()
+        assert b"__main__" not in written, "CLI cache entry references __main__ classes"
+
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": str(cache_home)}):
+            loaded = load_schematic(sch_path)
+        assert type(loaded) is kicad_chat.Schematic, f"loaded a {type(loaded)!r}"
+        assert entries[0].read_bytes() == written, \
+            "load_schematic(): CLI cache entry was reparsed and rewritten"
+        print("✅ load_schematic(): reuses a cache entry written by the CLI")
+
+
+def run_test(test, *args) -> bool:
+    """Run one test outside pytest, reporting a failed assert instead of raising."""
+    try:
+        test(*args)
+        return True
+    except AssertionError as e:
+        print(f"❌ {e}")
+        return False
     except Exception as e:
-        print(f"❌ Tools test failed: {e}")
+        print(f"❌ {test.__name__} failed: {e}")
         return False
 
 
@@ -133,10 +488,31 @@ def main():
     """Run all tests."""
     print("🧪 KiCad-Chat MVP Tests\n")
 
+    if not EXAMPLE_PATH.exists():
+        print(f"❌ Example schematic not found: {EXAMPLE_PATH}")
+        return 1
+    try:
+        schematic = parse_example()
+        pic_schematic = KiCadSchematicParser(PIC_PATH).parse()
+    except Exception as e:
+        print(f"❌ Parser failed: {e}")
+        return 1
+
     success = True
 
-    success &= test_parser()
-    success &= test_tools()
+    success &= run_test(test_parser, schematic)
+    success &= run_test(test_wire_array, schematic)
+    success &= run_test(test_sexp_parser)
+    success &= run_test(test_connectivity)
+    success &= run_test(test_tools, schematic)
+    success &= run_test(test_component_filters, pic_schematic)
+    success &= run_test(test_value_search, pic_schematic)
+    success &= run_test(test_compact_tool_result)
+    success &= run_test(test_streamed_tool_calls, schematic)
+    success &= run_test(test_chat_transcript, schematic)
+    success &= run_test(test_service_tier_fallback, schematic)
+    success &= run_test(test_parse_cache)
+    success &= run_test(test_parse_cache_from_cli)
 
     if success:
         print("\n🎉 All tests passed!")